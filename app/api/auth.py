@@ -3,10 +3,11 @@ from fastapi.responses import RedirectResponse
 from typing import Dict
 import json
 
+from app.core import upstream
 from app.services.auth_service import AuthService
 from app.core.security import create_access_token, verify_token
 
-router = APIRouter()
+router = APIRouter(route_class=upstream.UpstreamRoute)
 
 # Store sessions in memory (in production, use Redis or database)
 user_sessions = {}
@@ -17,8 +18,8 @@ async def spotify_login():
     auth_url = AuthService.get_authorization_url()
     return RedirectResponse(auth_url)
 
-@router.get("/callback")
-async def spotify_callback(
+@router.get("/callback", dependencies=[Depends(upstream.admit)])
+def spotify_callback(
     code: str = None,
     state: str = None,
     error: str = None
@@ -100,6 +101,8 @@ async def spotify_callback(
         frontend_url = f"http://localhost:3000/auth/callback?data={data_b64}"
         return RedirectResponse(url=frontend_url)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
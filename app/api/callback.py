@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Request
 from fastapi.responses import RedirectResponse
 import urllib.parse
+from app.core.timing import TimedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 @router.get("/callback")
 async def spotify_callback_redirect(request: Request):
@@ -0,0 +1,86 @@
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List
+import json
+
+from app.api.auth import user_sessions
+from app.core import upstream
+from app.core.security import verify_token
+from app.services.playlist_service import PlaylistService, PlaylistWriteError
+
+router = APIRouter(route_class=upstream.UpstreamRoute)
+
+class PlaylistCreate(BaseModel):
+    name: str = Field(..., min_length=1, description="Playlist name")
+    description: str = Field("", description="Playlist description")
+    public: bool = Field(False, description="Make the playlist public")
+    uris: List[str] = Field(..., min_length=1, description="Track URIs, in order")
+
+@router.post("", dependencies=[Depends(upstream.admit)])
+def create_playlist(
+    playlist: PlaylistCreate,
+    token: dict = Depends(verify_token)
+):
+    """
+    Create a playlist for the logged-in user and fill it with tracks
+
+    Streams newline-delimited JSON progress events while the tracks are
+    written in 100-item chunks, two at a time.
+    """
+    user_id = token.get("sub")
+
+    if user_id not in user_sessions:
+        raise HTTPException(
+            status_code=401,
+            detail="User not found or session expired"
+        )
+
+    access_token = user_sessions[user_id]["access_token"]
+
+    try:
+        created = PlaylistService.create_playlist(
+            access_token,
+            user_id,
+            name=playlist.name,
+            description=playlist.description,
+            public=playlist.public
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    def progress():
+        yield json.dumps({
+            "event": "created",
+            "playlist_id": created["id"],
+            "total": len(playlist.uris)
+        }) + "\n"
+
+        try:
+            for event in PlaylistService.populate_playlist(
+                access_token, created["id"], playlist.uris
+            ):
+                yield json.dumps(event) + "\n"
+        except PlaylistWriteError as e:
+            # Headers are already sent, so report the failure in the stream,
+            # with the chunks that made it so the client knows what's missing
+            yield json.dumps({
+                "event": "error",
+                "detail": str(e),
+                "written_chunks": e.written
+            }) + "\n"
+            return
+        except Exception as e:
+            # Headers are already sent, so report the failure in the stream
+            yield json.dumps({"event": "error", "detail": str(e)}) + "\n"
+            return
+
+        yield json.dumps({
+            "event": "done",
+            "playlist_id": created["id"],
+            "external_url": created.get("external_urls", {}).get("spotify")
+        }) + "\n"
+
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
@@ -1,12 +1,13 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Depends
 from typing import List, Optional
-import requests
+from app.core import upstream
 from app.services.spotify_service import SpotifyService
+from app.services.artist_index import artist_index
 
-router = APIRouter()
+router = APIRouter(route_class=upstream.UpstreamRoute)
 
-@router.get("/token")
-async def get_token():
+@router.get("/token", dependencies=[Depends(upstream.admit)])
+def get_token():
     """Get Spotify access token"""
     try:
         token = SpotifyService.get_client_token()
@@ -17,17 +18,21 @@ async def get_token():
             "token_preview": token_preview,
             "message": "Token obtained successfully"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/token/health")
-async def check_token_health():
+@router.get("/token/health", dependencies=[Depends(upstream.admit)])
+def check_token_health():
     """Check if Spotify token is working"""
     try:
         token = SpotifyService.get_client_token()
         
         # Test the token with a simple API call
-        test_response = requests.get(
+        test_response = upstream.request(
+            "search",
+            "GET",
             "https://api.spotify.com/v1/search",
             headers={"Authorization": f"Bearer {token}"},
             params={"q": "test", "type": "track", "limit": 1}
@@ -45,8 +50,8 @@ async def check_token_health():
             "error": str(e)
         }
 
-@router.get("/search")
-async def search(
+@router.get("/search", dependencies=[Depends(upstream.admit)])
+def search(
     q: str = Query(..., description="Search query"),
     type: str = Query("track", description="Type of search (track, artist, album, playlist)"),
     limit: int = Query(20, ge=1, le=50, description="Number of results (1-50)"),
@@ -82,11 +87,13 @@ async def search(
             "total": total,
             "results": results
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/search/tracks")
-async def search_tracks(
+@router.get("/search/tracks", dependencies=[Depends(upstream.admit)])
+def search_tracks(
     q: str = Query(..., description="Search query for tracks"),
     limit: int = Query(20, ge=1, le=50, description="Number of results (1-50)"),
     offset: int = Query(0, ge=0, description="Pagination offset")
@@ -106,6 +113,8 @@ async def search_tracks(
             "total_tracks": len(tracks),
             "tracks": tracks
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -115,8 +124,8 @@ async def test_endpoint():
     return {"message": "Spotify API is working!"}
 
 
-@router.get("/search/artists")
-async def search_artists(
+@router.get("/search/artists", dependencies=[Depends(upstream.admit)])
+def search_artists(
     q: str = Query(..., description="Search query for artists"),
     limit: int = Query(20, ge=1, le=50, description="Number of results (1-50)"),
     offset: int = Query(0, ge=0, description="Pagination offset")
@@ -136,5 +145,29 @@ async def search_artists(
             "total_artists": len(artists),
             "artists": artists
         }
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/artists/{artist_id}/similar")
+def similar_artists(
+    artist_id: str,
+    limit: int = Query(10, ge=1, le=100, description="Number of results (1-100)")
+):
+    """Similar artists from the local genre index (no Spotify calls)"""
+    similar = artist_index.similar(artist_id, limit=limit)
+    
+    if similar is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Artist not indexed yet - find it through /search/artists first"
+        )
+    
+    return {
+        "artist": artist_index.describe(artist_id),
+        "limit": limit,
+        "total_artists": len(similar),
+        "artists": similar
+    }
\ No newline at end of file
@@ -4,18 +4,67 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
+# Per-user home for files the workers share; must stay private to this user
+_APP_DIR = os.path.join(os.path.expanduser("~"), ".cache", "rds_spotify")
+
 class Settings:
     # Spotify Credentials
     SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
     SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
     SPOTIFY_REDIRECT_URI = os.getenv("SPOTIFY_REDIRECT_URI")
     
+    # App token shared by all workers on the host (directory must be private)
+    SPOTIFY_TOKEN_FILE = os.getenv("SPOTIFY_TOKEN_FILE") or os.path.join(
+        _APP_DIR, "token.json"
+    )
+    SPOTIFY_TOKEN_TIMEOUT = float(os.getenv("SPOTIFY_TOKEN_TIMEOUT", 10))
+    SPOTIFY_TOKEN_LOCK_TIMEOUT = float(os.getenv("SPOTIFY_TOKEN_LOCK_TIMEOUT", 15))
+    
     # App Configuration
     DEBUG = os.getenv("DEBUG", "False").lower() == "true"
     PORT = int(os.getenv("PORT", 8000))
     
     # JWT Secret Key
     SECRET_KEY = os.getenv("SECRET_KEY", "fallback-secret-key-change-in-production")
+    
+    # Search Cache (aligned 50-item upstream pages)
+    SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", 300))
+    SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", 1000))
+    
+    # Playlist Writes (100-item chunks)
+    PLAYLIST_CHUNK_RETRIES = int(os.getenv("PLAYLIST_CHUNK_RETRIES", 3))
+    
+    # Upstream Concurrency (slots for calls to Spotify)
+    UPSTREAM_MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", 32))
+    UPSTREAM_ENDPOINT_CONCURRENCY = int(os.getenv("UPSTREAM_ENDPOINT_CONCURRENCY", 16))
+    UPSTREAM_MAX_QUEUE = int(os.getenv("UPSTREAM_MAX_QUEUE", 64))
+    UPSTREAM_MAX_WAIT = float(os.getenv("UPSTREAM_MAX_WAIT", 2.0))
+    UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", 10))
+    # Adapt concurrency to latency (AIMD) around this target, in seconds
+    UPSTREAM_ADAPTIVE = os.getenv("UPSTREAM_ADAPTIVE", "False").lower() == "true"
+    UPSTREAM_TARGET_LATENCY = float(os.getenv("UPSTREAM_TARGET_LATENCY", 1.0))
+    
+    # Profiling (X-Debug-Profile header must match PROFILE_TOKEN; empty disables)
+    PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+    PROFILE_DIR = os.getenv("PROFILE_DIR") or os.path.join(_APP_DIR, "profiles")
+    PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.005))
+    
+    # Artist Similarity Index (memory-mapped on startup; directory must be private)
+    ARTIST_INDEX_DIR = os.getenv("ARTIST_INDEX_DIR") or os.path.join(_APP_DIR, "artists")
+    ARTIST_INDEX_LOCK_TIMEOUT = float(os.getenv("ARTIST_INDEX_LOCK_TIMEOUT", 30))
+    ARTIST_INDEX_FLUSH_EVERY = int(os.getenv("ARTIST_INDEX_FLUSH_EVERY", 500))
+    ARTIST_INDEX_POPULARITY_WEIGHT = float(os.getenv("ARTIST_INDEX_POPULARITY_WEIGHT", 0.1))
+    
+    # Rate Limiting (requests per sliding window, per user or per IP)
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "True").lower() == "true"
+    RATE_LIMIT_WINDOW = float(os.getenv("RATE_LIMIT_WINDOW", 60))
+    RATE_LIMIT_USER = int(os.getenv("RATE_LIMIT_USER", 120))
+    RATE_LIMIT_IP = int(os.getenv("RATE_LIMIT_IP", 60))
+    # SQLite file shared by all workers (directory must be private);
+    # ":memory:" keeps counters per process
+    RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB") or os.path.join(
+        _APP_DIR, "rate_limits.db"
+    )
 
 # Create settings instance
 settings = Settings()
\ No newline at end of file
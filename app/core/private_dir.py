@@ -0,0 +1,38 @@
+import os
+import stat
+
+
+def owned_and_private(st: os.stat_result) -> bool:
+    """True if we own the file and nobody else can write to it"""
+    if not hasattr(os, "getuid"):
+        return True
+    return st.st_uid == os.getuid() and not st.st_mode & 0o022
+
+
+def _make_private_dirs(directory: str):
+    """Like os.makedirs, but missing parents get 0700 too, not just the leaf"""
+    if os.path.isdir(directory):
+        return
+    parent = os.path.dirname(os.path.abspath(directory))
+    if parent != directory:
+        _make_private_dirs(parent)
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+
+
+def ensure_private_dir(directory: str) -> bool:
+    """
+    Create `directory` (0700) if needed and check that only we control it
+
+    Returns False if it can't be created, isn't a real directory, belongs
+    to someone else or is writable by anyone else.
+    """
+    try:
+        _make_private_dirs(directory)
+        st = os.lstat(directory)
+    except OSError:
+        return False
+
+    return stat.S_ISDIR(st.st_mode) and owned_and_private(st)
@@ -0,0 +1,238 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+
+from app.core.config import settings
+from app.core.private_dir import ensure_private_dir
+from app.core.security import verify_token
+
+# Paths that never count against a quota
+EXEMPT_PATHS = {"/health", "/docs", "/redoc", "/openapi.json"}
+
+
+def _sliding_window(
+    now: float,
+    window: float,
+    limit: int,
+    state: Optional[Tuple[float, int, int]]
+) -> Tuple[bool, float, Tuple[float, int, int]]:
+    """
+    Apply one hit to a sliding-window counter
+
+    The state is (window_start, current_count, previous_count). The request
+    rate is estimated as the current count plus the previous window's count
+    weighted by how much of it still overlaps the sliding window.
+
+    Returns:
+        (allowed, retry_after_seconds, new_state)
+    """
+    if limit < 1:
+        raise ValueError("Rate limit must be at least 1 request per window")
+
+    window_start = math.floor(now / window) * window
+    current, previous = 0, 0
+
+    if state:
+        stored_start, stored_current, stored_previous = state
+        if stored_start == window_start:
+            current, previous = stored_current, stored_previous
+        elif stored_start == window_start - window:
+            previous = stored_current
+
+    elapsed = now - window_start
+    estimated = previous * (1 - elapsed / window) + current
+
+    if estimated + 1 <= limit:
+        return True, 0.0, (window_start, current + 1, previous)
+
+    # Work out when the weighted estimate leaves room for one more request
+    if current + 1 <= limit and previous:
+        allowed_at = window_start + window * (1 - (limit - 1 - current) / previous)
+    else:
+        allowed_at = window_start + window * (2 - (limit - 1) / current)
+
+    return False, max(allowed_at - now, 0.0), (window_start, current, previous)
+
+
+class MemoryStore:
+    """Per-process counters, evicted once a key has been idle for two windows"""
+
+    def __init__(self, window: float):
+        self.window = window
+        self._counters = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: int, now: float) -> Tuple[bool, float]:
+        with self._lock:
+            self._evict(now)
+            state = self._counters.pop(key, None)
+            allowed, retry_after, new_state = _sliding_window(
+                now, self.window, limit, state and state[1:]
+            )
+            # Keys stay ordered by last hit, so idle ones sit at the front
+            self._counters[key] = (now, *new_state)
+            return allowed, retry_after
+
+    def _evict(self, now: float):
+        idle_before = now - 2 * self.window
+        while self._counters:
+            key, state = next(iter(self._counters.items()))
+            if state[0] >= idle_before:
+                break
+            del self._counters[key]
+
+
+class SQLiteStore:
+    """Counters shared by every worker on the host through a SQLite file"""
+
+    _EVICT_EVERY = 1000
+
+    def __init__(self, window: float, path: str):
+        self.window = window
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._conn = sqlite3.connect(
+            path,
+            timeout=5,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Every request commits; a few counter updates lost on power loss
+        # are harmless, an fsync per request serialized across workers isn't
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                key TEXT PRIMARY KEY,
+                last_seen REAL NOT NULL,
+                window_start REAL NOT NULL,
+                current INTEGER NOT NULL,
+                previous INTEGER NOT NULL
+            )
+            """
+        )
+
+    def hit(self, key: str, limit: int, now: float) -> Tuple[bool, float]:
+        with self._lock:
+            cursor = self._conn.cursor()
+            # IMMEDIATE takes the write lock up front so workers serialize
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                row = cursor.execute(
+                    "SELECT window_start, current, previous "
+                    "FROM rate_limits WHERE key = ?",
+                    (key,)
+                ).fetchone()
+                allowed, retry_after, new_state = _sliding_window(
+                    now, self.window, limit, row
+                )
+                cursor.execute(
+                    "INSERT OR REPLACE INTO rate_limits "
+                    "(key, last_seen, window_start, current, previous) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, now, *new_state)
+                )
+
+                self._hits += 1
+                if self._hits % self._EVICT_EVERY == 0:
+                    cursor.execute(
+                        "DELETE FROM rate_limits WHERE last_seen < ?",
+                        (now - 2 * self.window,)
+                    )
+
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+
+            return allowed, retry_after
+
+
+def get_principal(request: Request) -> Tuple[str, bool]:
+    """
+    Identify who a request counts against
+
+    Returns:
+        (key, is_user) - the JWT subject when a valid token is sent,
+        otherwise the client IP
+    """
+    authorization = request.headers.get("authorization")
+    if authorization:
+        try:
+            payload = verify_token(authorization)
+            if payload.get("sub"):
+                return f"user:{payload['sub']}", True
+        except HTTPException:
+            pass
+
+    client_ip = request.client.host if request.client else "unknown"
+    return f"ip:{client_ip}", False
+
+
+class RateLimitMiddleware(BaseHTTPMiddleware):
+    """Reject requests over quota with 429 before any route code runs"""
+
+    def __init__(self, app):
+        super().__init__(app)
+        if settings.RATE_LIMIT_ENABLED and (
+            settings.RATE_LIMIT_USER < 1 or settings.RATE_LIMIT_IP < 1
+        ):
+            raise ValueError(
+                "RATE_LIMIT_USER and RATE_LIMIT_IP must be at least 1 "
+                "(use RATE_LIMIT_ENABLED=False to turn limiting off)"
+            )
+        if settings.RATE_LIMIT_WINDOW <= 0:
+            raise ValueError("RATE_LIMIT_WINDOW must be positive")
+
+        self.store = self._new_store(settings.RATE_LIMIT_WINDOW, settings.RATE_LIMIT_DB)
+
+    @staticmethod
+    def _new_store(window: float, path: str):
+        if path == ":memory:":
+            return MemoryStore(window)
+
+        directory = os.path.dirname(path) or "."
+        if not ensure_private_dir(directory):
+            # Someone else could edit the counters or hold the write lock
+            print(
+                f"Shared rate limits disabled: {directory} is not private to this user; "
+                "each worker now allows the full quota"
+            )
+            return MemoryStore(window)
+
+        return SQLiteStore(window, path)
+
+    async def dispatch(self, request: Request, call_next):
+        if not settings.RATE_LIMIT_ENABLED or request.url.path in EXEMPT_PATHS:
+            return await call_next(request)
+
+        key, is_user = get_principal(request)
+        limit = settings.RATE_LIMIT_USER if is_user else settings.RATE_LIMIT_IP
+
+        if isinstance(self.store, SQLiteStore):
+            # SQLite may wait on other workers' locks; keep the event loop free
+            allowed, retry_after = await run_in_threadpool(
+                self.store.hit, key, limit, time.time()
+            )
+        else:
+            allowed, retry_after = self.store.hit(key, limit, time.time())
+
+        if not allowed:
+            return JSONResponse(
+                status_code=429,
+                content={"detail": "Rate limit exceeded"},
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+
+        return await call_next(request)
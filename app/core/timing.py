@@ -0,0 +1,256 @@
+import functools
+import inspect
+import os
+import secrets
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from anyio import to_thread
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+
+from app.core.config import settings
+from app.core.private_dir import ensure_private_dir
+
+PROFILE_HEADER = "X-Debug-Profile"
+
+
+class StackSampler:
+    """
+    Minimal sampling profiler
+
+    A background thread snapshots the stacks of the registered threads
+    every `interval` seconds and counts them in collapsed ("folded")
+    format, which flamegraph.pl and speedscope read directly.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.threads = set()
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in list(self.threads):
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                    )
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.items())
+
+
+class RequestTimings:
+    """Per-request phase durations, plus the sampler when profiling"""
+
+    def __init__(self, sampler: Optional[StackSampler] = None):
+        self.durations: Dict[str, float] = {}
+        self.sampler = sampler
+        self._started: Dict[str, float] = {}
+
+    def start(self, name: str) -> bool:
+        """Start timing `name`; False if it is already running"""
+        if name in self._started:
+            return False
+        self._started[name] = time.perf_counter()
+        return True
+
+    def stop(self, name: str):
+        started = self._started.pop(name, None)
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            self.durations[name] = self.durations.get(name, 0.0) + elapsed
+
+    def server_timing(self, total: float) -> str:
+        entries = [
+            f"{name};dur={seconds * 1000:.1f}"
+            for name, seconds in self.durations.items()
+        ]
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def phase(name: str):
+    """Add the time spent in the block to the current request's `name` phase"""
+    timings = _current.get()
+    # Nested blocks of the same phase are already covered by the outer one
+    if timings is None or not timings.start(name):
+        yield
+        return
+
+    try:
+        yield
+    finally:
+        timings.stop(name)
+
+
+@contextmanager
+def _profiled_thread():
+    """Have the sampler watch the current thread while the block runs"""
+    timings = _current.get()
+    if timings is None or timings.sampler is None:
+        yield
+        return
+
+    ident = threading.get_ident()
+    timings.sampler.threads.add(ident)
+    try:
+        yield
+    finally:
+        timings.sampler.threads.discard(ident)
+
+
+def _run_on_threads(func, limiter):
+    """Async wrapper running `func` on worker threads bounded by `limiter`"""
+    @functools.wraps(func)
+    async def run(*args, **kw):
+        return await to_thread.run_sync(functools.partial(func, *args, **kw), limiter=limiter)
+
+    return run
+
+
+def _start_serialize():
+    timings = _current.get()
+    if timings is not None:
+        timings.start("serialize")
+
+
+class TimedRoute(APIRoute):
+    """
+    Route whose handler is profiled on the thread that actually runs it
+
+    Sync handlers run on a threadpool worker, so the sampler has to follow
+    that thread rather than the event loop. Everything between the handler
+    returning and the response being ready (jsonable_encoder, response
+    validation, rendering) counts as the `serialize` phase.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if inspect.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def profiled(*args, **kw):
+                with _profiled_thread():
+                    result = await endpoint(*args, **kw)
+                _start_serialize()
+                return result
+        else:
+            @functools.wraps(endpoint)
+            def profiled(*args, **kw):
+                with _profiled_thread():
+                    result = endpoint(*args, **kw)
+                _start_serialize()
+                return result
+
+            limiter = self.thread_limiter(kwargs.get("dependencies") or [])
+            if limiter is not None:
+                profiled = _run_on_threads(profiled, limiter)
+
+        super().__init__(path, profiled, **kwargs)
+        # include_router rebuilds routes from .endpoint; don't wrap twice
+        self.endpoint = endpoint
+
+    def thread_limiter(self, dependencies):
+        """CapacityLimiter to run a sync handler under, None for the default pool"""
+        return None
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request: Request):
+            try:
+                return await handler(request)
+            finally:
+                timings = _current.get()
+                if timings is not None:
+                    timings.stop("serialize")
+
+        return timed_handler
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that records rendering as the `serialize` phase"""
+
+    def render(self, content) -> bytes:
+        with phase("serialize"):
+            return super().render(content)
+
+
+def _profiling_authorized(request: Request) -> bool:
+    supplied = request.headers.get(PROFILE_HEADER)
+    if not supplied or not settings.PROFILE_TOKEN:
+        return False
+    return secrets.compare_digest(supplied, settings.PROFILE_TOKEN)
+
+
+class ServerTimingMiddleware(BaseHTTPMiddleware):
+    """
+    Add a Server-Timing header broken down by phase to every response
+
+    Requests carrying a valid X-Debug-Profile header are also sampled
+    (handlers on TimedRoute routes, on their own thread), and the
+    folded-stack profile is written to PROFILE_DIR; its file name comes
+    back in the X-Profile header.
+    """
+
+    async def dispatch(self, request: Request, call_next):
+        sampler = None
+        if _profiling_authorized(request):
+            sampler = StackSampler(settings.PROFILE_INTERVAL)
+            sampler.start()
+
+        timings = RequestTimings(sampler)
+        context_token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            _current.reset(context_token)
+            if sampler is not None:
+                sampler.stop()
+
+        response.headers["Server-Timing"] = timings.server_timing(
+            time.perf_counter() - start
+        )
+
+        if sampler is not None:
+            if not ensure_private_dir(settings.PROFILE_DIR):
+                print(f"Profile not saved: {settings.PROFILE_DIR} is not private to this user")
+                return response
+
+            filename = f"{uuid.uuid4().hex}.folded"
+            with open(os.path.join(settings.PROFILE_DIR, filename), "w") as f:
+                f.write(sampler.folded())
+            response.headers["X-Profile"] = filename
+
+        return response
@@ -0,0 +1,132 @@
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from app.core.private_dir import ensure_private_dir, owned_and_private
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, each process refreshes itself
+    fcntl = None
+
+_O_NOFOLLOW = getattr(os, "O_NOFOLLOW", 0)
+
+
+class SharedTokenStore:
+    """
+    Host-wide token cache shared by all workers through a JSON file
+
+    Writes go to a temp file that is atomically renamed into place, so
+    readers never see a half-written token and need no lock. Refreshes are
+    serialized with an flock on a separate lock file; the kernel drops the
+    lock if the refreshing process dies, so a crash mid-refresh only means
+    the next caller takes over.
+
+    The directory must belong to us and not be writable by anyone else,
+    otherwise another local user could plant a token or sit on the lock.
+    If it doesn't pass, the store is disabled and each process keeps its
+    own token.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.enabled = self._check_directory()
+
+    def _check_directory(self) -> bool:
+        directory = os.path.dirname(self.path) or "."
+        if not ensure_private_dir(directory):
+            print(f"Shared token store disabled: {directory} is not private to this user")
+            return False
+        return True
+
+    def read(self) -> Optional[Dict]:
+        """Return the stored token data, or None if missing or unreadable"""
+        if not self.enabled:
+            return None
+
+        try:
+            fd = os.open(self.path, os.O_RDONLY | _O_NOFOLLOW)
+        except OSError:
+            return None
+
+        try:
+            if not owned_and_private(os.fstat(fd)):
+                return None
+            with os.fdopen(fd) as f:
+                fd = None
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+    def write(self, data: Dict):
+        """Atomically replace the stored token data"""
+        if not self.enabled:
+            return
+
+        directory = os.path.dirname(self.path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".token-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def clear(self):
+        """Remove the stored token"""
+        if not self.enabled:
+            return
+
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def refresh_lock(self, timeout: float = 0):
+        """
+        Hold the refresh lock, waiting at most `timeout` seconds for it
+
+        Yields True when the lock was acquired, False when another process
+        still held it after the timeout.
+        """
+        if fcntl is None or not self.enabled:
+            yield True
+            return
+
+        try:
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT | _O_NOFOLLOW, 0o600)
+        except OSError:
+            yield False
+            return
+
+        try:
+            if not owned_and_private(os.fstat(fd)):
+                yield False
+                return
+
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        yield False
+                        return
+                    time.sleep(0.05)
+
+            try:
+                yield True
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
@@ -0,0 +1,291 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+import requests
+from anyio import CapacityLimiter
+from fastapi import HTTPException
+
+from app.core import timing
+from app.core.config import settings
+
+
+class UpstreamOverloaded(HTTPException):
+    """Raised when an upstream call can't get a slot in time (503)"""
+
+    def __init__(self, limiter: "ConcurrencyLimiter", reason: str):
+        super().__init__(
+            status_code=503,
+            detail={
+                "message": f"Spotify upstream busy: {reason}",
+                "limiter": limiter.name,
+                **limiter.metrics()
+            },
+            headers={"Retry-After": "1"}
+        )
+
+
+class ConcurrencyLimiter:
+    """
+    Bounded concurrency with a bounded, time-limited wait queue
+
+    With `adaptive` on, the limit follows observed latency AIMD-style: it
+    grows by 1/limit for each fast call and is cut by `backoff` whenever a
+    call is slow or Spotify pushes back (429/5xx), never exceeding
+    `max_limit`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_limit: int,
+        max_queue: int,
+        max_wait: float,
+        adaptive: bool = False,
+        target_latency: float = 1.0,
+        backoff: float = 0.9
+    ):
+        self.name = name
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.adaptive = adaptive
+        self.target_latency = target_latency
+        self.backoff = backoff
+
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+
+    def _capacity(self) -> int:
+        return max(1, int(self.limit))
+
+    def acquire(self):
+        with self._cond:
+            if self.in_flight < self._capacity() and not self.queued:
+                self.in_flight += 1
+                return
+
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise UpstreamOverloaded(self, "queue full")
+
+            deadline = time.monotonic() + self.max_wait
+            self.queued += 1
+            try:
+                while self.in_flight >= self._capacity():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise UpstreamOverloaded(self, "queue wait timed out")
+                    self._cond.wait(remaining)
+            finally:
+                self.queued -= 1
+
+            self.in_flight += 1
+
+    def release(self, latency: float, overloaded: bool = False):
+        with self._cond:
+            self.in_flight -= 1
+
+            if self.adaptive:
+                if overloaded or latency > self.target_latency:
+                    self.limit = max(1.0, self.limit * self.backoff)
+                else:
+                    self.limit = min(
+                        float(self.max_limit),
+                        self.limit + 1 / self.limit
+                    )
+
+            self._cond.notify_all()
+
+    def cancel(self):
+        """Give back a slot that was never used for a call"""
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def metrics(self) -> Dict:
+        return {
+            "limit": self._capacity(),
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "max_wait": self.max_wait,
+            "rejected": self.rejected
+        }
+
+
+class AdmissionLimiter:
+    """
+    Async gate in front of the threadpool
+
+    Sync handlers wait for a threadpool thread before they can reach a
+    ConcurrencyLimiter, and that wait has no bound. Routes that call
+    Spotify take one of these slots on the event loop first, so excess
+    requests get their 503 before they ever queue for a thread. Admitted
+    handlers then run on threads reserved for them (see UpstreamRoute).
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def acquire(self):
+        if not self._semaphore.locked():
+            # Free slot: acquire() returns without suspending
+            await self._semaphore.acquire()
+            self.in_flight += 1
+            return
+
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise UpstreamOverloaded(self, "queue full")
+
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.max_wait)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise UpstreamOverloaded(self, "queue wait timed out")
+        finally:
+            self.queued -= 1
+
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def metrics(self) -> Dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "max_wait": self.max_wait,
+            "rejected": self.rejected
+        }
+
+
+def _new_limiter(name: str, max_limit: int) -> ConcurrencyLimiter:
+    return ConcurrencyLimiter(
+        name,
+        max_limit=max_limit,
+        max_queue=settings.UPSTREAM_MAX_QUEUE,
+        max_wait=settings.UPSTREAM_MAX_WAIT,
+        adaptive=settings.UPSTREAM_ADAPTIVE,
+        target_latency=settings.UPSTREAM_TARGET_LATENCY
+    )
+
+
+_global_limiter = _new_limiter("global", settings.UPSTREAM_MAX_CONCURRENCY)
+_admission = AdmissionLimiter(
+    "admission",
+    settings.UPSTREAM_MAX_CONCURRENCY,
+    settings.UPSTREAM_MAX_QUEUE,
+    settings.UPSTREAM_MAX_WAIT
+)
+# One thread per admission slot, apart from the default threadpool
+_handler_threads = CapacityLimiter(settings.UPSTREAM_MAX_CONCURRENCY)
+_endpoint_limiters: Dict[str, ConcurrencyLimiter] = {}
+_endpoint_lock = threading.Lock()
+
+
+def _endpoint_limiter(endpoint: str) -> ConcurrencyLimiter:
+    with _endpoint_lock:
+        if endpoint not in _endpoint_limiters:
+            _endpoint_limiters[endpoint] = _new_limiter(
+                endpoint, settings.UPSTREAM_ENDPOINT_CONCURRENCY
+            )
+        return _endpoint_limiters[endpoint]
+
+
+@contextmanager
+def _slots(endpoint: str):
+    """Hold an endpoint slot and a global slot; yields a status recorder"""
+    # Endpoint first, so a busy endpoint doesn't sit on global capacity
+    endpoint_limiter = _endpoint_limiter(endpoint)
+    endpoint_limiter.acquire()
+    try:
+        _global_limiter.acquire()
+    except Exception:
+        endpoint_limiter.cancel()
+        raise
+
+    outcome = {"overloaded": False}
+    start = time.monotonic()
+    try:
+        yield outcome
+    except requests.RequestException:
+        outcome["overloaded"] = True
+        raise
+    finally:
+        latency = time.monotonic() - start
+        _global_limiter.release(latency, outcome["overloaded"])
+        endpoint_limiter.release(latency, outcome["overloaded"])
+
+
+async def admit():
+    """Route dependency: hold an admission slot while the handler runs"""
+    await _admission.acquire()
+    try:
+        yield
+    finally:
+        _admission.release()
+
+
+class UpstreamRoute(timing.TimedRoute):
+    """
+    TimedRoute that runs sync handlers depending on admit() on their own threads
+
+    Other work (non-admitted routes, sync dependencies, streamed bodies,
+    the SQLite rate limiter) shares the default threadpool. Without a
+    separate limiter a burst of it could make admitted handlers queue
+    for a thread again, with no bound.
+    """
+
+    def thread_limiter(self, dependencies):
+        if any(depends.dependency is admit for depends in dependencies):
+            return _handler_threads
+        return None
+
+
+def request(endpoint: str, method: str, url: str, **kwargs) -> requests.Response:
+    """
+    Make an HTTP call to Spotify under the global and per-endpoint limits
+
+    Raises:
+        UpstreamOverloaded: no slot was available within the wait budget
+    """
+    # A hung connection would otherwise hold its slots forever
+    kwargs.setdefault("timeout", settings.UPSTREAM_TIMEOUT)
+    phase = "token" if endpoint == "token" else "upstream"
+    with timing.phase(phase), _slots(endpoint) as outcome:
+        response = requests.request(method, url, **kwargs)
+        outcome["overloaded"] = (
+            response.status_code == 429 or response.status_code >= 500
+        )
+        return response
+
+
+def metrics() -> Dict:
+    """Current limiter state, for health checks"""
+    with _endpoint_lock:
+        endpoints = dict(_endpoint_limiters)
+    return {
+        "admission": _admission.metrics(),
+        "global": _global_limiter.metrics(),
+        "endpoints": {name: limiter.metrics() for name, limiter in endpoints.items()}
+    }
@@ -0,0 +1,489 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.private_dir import ensure_private_dir
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, single worker only
+    fcntl = None
+
+# Per-generation .npy files, all memory-mapped
+_ARRAYS = ("indptr", "indices", "popularity", "ids", "id_order", "name_offsets", "names")
+
+
+def _save_array(directory: str, name: str, array: np.ndarray):
+    with open(os.path.join(directory, f"{name}.npy"), "wb") as f:
+        np.save(f, array)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _empty_arrays() -> Dict[str, np.ndarray]:
+    return {
+        "indptr": np.zeros(1, dtype=np.int64),
+        "indices": np.zeros(0, dtype=np.int32),
+        "popularity": np.zeros(0, dtype=np.uint8),
+        "ids": np.zeros(0, dtype="S1"),
+        "id_order": np.zeros(0, dtype=np.int64),
+        "name_offsets": np.zeros(1, dtype=np.int64),
+        "names": np.zeros(0, dtype=np.uint8)
+    }
+
+
+def _find_rows(ids: np.ndarray, order: np.ndarray, keys: np.ndarray) -> np.ndarray:
+    """Rows of `keys` in `ids` (binary search through `order`), -1 where absent"""
+    if not len(ids) or not len(keys):
+        return np.full(len(keys), -1, dtype=np.int64)
+    positions = np.minimum(np.searchsorted(ids, keys, sorter=order), len(ids) - 1)
+    rows = np.asarray(order[positions])
+    return np.where(ids[rows] == keys, rows, -1)
+
+
+def _encode_ids(artist_ids: List[str]) -> np.ndarray:
+    return np.array([artist_id.encode() for artist_id in artist_ids], dtype=np.bytes_)
+
+
+def _fsync_dir(directory: str):
+    """Make renames and new entries in `directory` durable"""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class ArtistIndex:
+    """
+    Local artist similarity index built from the artists we see in searches
+
+    Genres are stored as a sparse CSR matrix (one row per artist, one
+    column per genre, all weights 1). Ids are a fixed-width bytes array
+    searched through its argsort, and names are offsets into a UTF-8
+    blob, so every per-artist array is a .npy file. Each flush writes a
+    new generation directory of them plus a meta.json with the (small)
+    genre list, then atomically points CURRENT at it. On startup and
+    after other workers flush, the arrays are memory-mapped rather than
+    read into memory.
+
+    Artists seen since the last flush sit in a small pending list that
+    is scored alongside the mapped arrays. Flushes triggered by searches
+    run on a background thread, so requests never wait on the rewrite.
+
+    The directory must belong to us and not be writable by anyone else,
+    otherwise another local user could feed us an index or sit on the
+    lock. If it doesn't pass, nothing is read or written and the index
+    only lives in memory.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flushing = False
+        self._current_mtime = None
+
+        self._genres: List[str] = []
+        self._genre_ids: Dict[str, int] = {}
+        self._use_arrays(_empty_arrays())
+
+        self._pending: List[Dict] = []
+        self._pending_rows: Dict[str, int] = {}
+        self._pending_arrays = None
+
+        self.enabled = ensure_private_dir(path)
+        if not self.enabled:
+            print(f"Artist index not persisted: {path} is not private to this user")
+            return
+        self._reload()
+
+    def __len__(self) -> int:
+        return len(self._ids) + len(self._pending)
+
+    def add_artists(self, artists: List[Dict]):
+        """Add formatted artists (from SpotifyService.search_artists)"""
+        with self._lock:
+            for artist in artists:
+                artist_id = artist.get("id")
+                if not artist_id or self._row(artist_id) is not None:
+                    continue
+
+                self._pending_rows[artist_id] = len(self)
+                self._pending.append({
+                    "id": artist_id,
+                    "name": artist.get("name") or "",
+                    "genres": sorted(set(artist.get("genres") or [])),
+                    "popularity": artist.get("popularity") or 0
+                })
+                for genre in self._pending[-1]["genres"]:
+                    self._genre_id(genre)
+                self._pending_arrays = None
+
+            # Flush in proportion to the index size so rewrites stay amortized O(1)
+            flush_at = max(settings.ARTIST_INDEX_FLUSH_EVERY, len(self._ids) // 10)
+            start_flush = (
+                self.enabled and len(self._pending) >= flush_at and not self._flushing
+            )
+            if start_flush:
+                self._flushing = True
+
+        if start_flush:
+            threading.Thread(target=self._background_flush, daemon=True).start()
+
+    def flush(self):
+        """Write pending artists to disk, after any flush already running"""
+        self._flush()
+
+    def similar(self, artist_id: str, limit: int = 10) -> Optional[List[Dict]]:
+        """
+        Top artists by genre cosine similarity plus a popularity prior
+
+        Returns:
+            Scored artists, or None if the artist isn't in the index
+        """
+        with self._lock:
+            self._reload_if_changed()
+
+            row = self._row(artist_id)
+            if row is None:
+                return None
+
+            segments = self._segments()
+            offset, indptr, indices, _ = self._locate(segments, row)
+            query = np.array(indices[indptr[row - offset]:indptr[row - offset + 1]])
+            if not len(query):
+                return []
+
+            rows, cosines, popularities = [], [], []
+            for offset, indptr, indices, popularity in segments:
+                # Count shared genres per artist in one pass over the CSR entries
+                hits = np.isin(indices, query)
+                cumulative = np.concatenate(([0], np.cumsum(hits, dtype=np.int64)))
+                shared = cumulative[indptr[1:]] - cumulative[indptr[:-1]]
+
+                candidates = np.flatnonzero(shared)
+                sizes = (indptr[candidates + 1] - indptr[candidates]).astype(np.float64)
+                rows.append(candidates + offset)
+                cosines.append(shared[candidates] / np.sqrt(sizes * len(query)))
+                popularities.append(popularity[candidates])
+
+            rows = np.concatenate(rows)
+            keep = rows != row
+            rows = rows[keep]
+            cosine = np.concatenate(cosines)[keep]
+            scores = cosine + settings.ARTIST_INDEX_POPULARITY_WEIGHT * (
+                np.concatenate(popularities)[keep] / 100.0
+            )
+
+            top = min(limit, len(rows))
+            if not top:
+                return []
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best])]
+
+            return [
+                {
+                    **self._describe(segments, int(rows[i])),
+                    "similarity": round(float(cosine[i]), 4),
+                    "score": round(float(scores[i]), 4)
+                }
+                for i in best
+            ]
+
+    def describe(self, artist_id: str) -> Optional[Dict]:
+        """Stored data for one artist"""
+        with self._lock:
+            self._reload_if_changed()
+
+            row = self._row(artist_id)
+            if row is None:
+                return None
+            return self._describe(self._segments(), row)
+
+    def _describe(self, segments, row: int) -> Dict:
+        offset, indptr, indices, popularity = self._locate(segments, row)
+        # Pending rows follow the mapped ones, which may be none at all
+        if row < len(self._ids):
+            artist_id = self._ids[row].decode()
+            name = bytes(self._names[self._name_offsets[row]:self._name_offsets[row + 1]]).decode()
+        else:
+            pending = self._pending[row - offset]
+            artist_id, name = pending["id"], pending["name"]
+
+        local_row = row - offset
+        return {
+            "id": artist_id,
+            "name": name,
+            "genres": [
+                self._genres[g]
+                for g in indices[indptr[local_row]:indptr[local_row + 1]]
+            ],
+            "popularity": int(popularity[local_row])
+        }
+
+    def _row(self, artist_id: str) -> Optional[int]:
+        """Global row of an artist, mapped or pending"""
+        if artist_id in self._pending_rows:
+            return self._pending_rows[artist_id]
+        row = int(_find_rows(self._ids, self._id_order, _encode_ids([artist_id]))[0])
+        return row if row >= 0 else None
+
+    def _genre_id(self, genre: str) -> int:
+        if genre not in self._genre_ids:
+            self._genre_ids[genre] = len(self._genres)
+            self._genres.append(genre)
+        return self._genre_ids[genre]
+
+    def _segments(self):
+        """
+        (row offset, indptr, indices, popularity) for the mapped arrays and,
+        when there are any, the pending artists
+        """
+        segments = [(0, self._indptr, self._indices, self._popularity)]
+        if not self._pending:
+            return segments
+
+        if self._pending_arrays is None:
+            lengths = [len(artist["genres"]) for artist in self._pending]
+            self._pending_arrays = (
+                len(self._ids),
+                np.concatenate(([0], np.cumsum(lengths, dtype=np.int64))),
+                np.array(
+                    [self._genre_ids[g] for artist in self._pending for g in artist["genres"]],
+                    dtype=np.int32
+                ),
+                np.array(
+                    [artist["popularity"] for artist in self._pending],
+                    dtype=np.uint8
+                )
+            )
+
+        segments.append(self._pending_arrays)
+        return segments
+
+    @staticmethod
+    def _locate(segments, row: int):
+        """The segment holding a global row"""
+        for segment in reversed(segments):
+            if row >= segment[0]:
+                return segment
+
+    @contextmanager
+    def _file_lock(self, timeout: float):
+        """Hold the cross-process flush lock, waiting at most `timeout` seconds"""
+        if fcntl is None:
+            yield
+            return
+
+        fd = os.open(os.path.join(self.path, ".lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        raise TimeoutError(
+                            f"Artist index lock still held after {timeout}s"
+                        )
+                    time.sleep(0.05)
+            yield
+        finally:
+            os.close(fd)
+
+    def _current_file(self) -> str:
+        return os.path.join(self.path, "CURRENT")
+
+    def _read_generation(self):
+        """
+        Map the generation CURRENT points at, or None if nothing was flushed yet
+
+        Raises:
+            OSError, ValueError: there is a generation but it can't be read
+        """
+        try:
+            with open(self._current_file()) as f:
+                generation = os.path.join(self.path, f.read().strip())
+        except FileNotFoundError:
+            return None
+
+        with open(os.path.join(generation, "meta.json")) as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(generation, f"{name}.npy"), mmap_mode="r")
+            for name in _ARRAYS
+        }
+        return meta, arrays
+
+    def _reload(self):
+        """Map the current generation and drop pending artists it already has"""
+        try:
+            self._current_mtime = os.stat(self._current_file()).st_mtime_ns
+        except FileNotFoundError:
+            self._current_mtime = None
+
+        try:
+            loaded = self._read_generation()
+        except (OSError, ValueError) as e:
+            # Keep what we have; also happens if another worker flushed mid-read
+            print(f"Artist index reload failed: {str(e)}")
+            return
+        if loaded is None:
+            return
+
+        meta, arrays = loaded
+        self._use_arrays(arrays)
+
+        # Genres added locally since the last flush keep their new ids
+        stored_genres = set(meta["genres"])
+        local_genres = [g for g in self._genres if g not in stored_genres]
+        self._genres = []
+        self._genre_ids = {}
+        for genre in meta["genres"] + local_genres:
+            self._genre_id(genre)
+
+        # Drop pending artists that are now mapped (flushed here or elsewhere)
+        found = _find_rows(
+            self._ids, self._id_order, _encode_ids([a["id"] for a in self._pending])
+        )
+        self._pending = [a for a, row in zip(self._pending, found) if row < 0]
+        self._pending_rows = {
+            artist["id"]: len(self._ids) + i for i, artist in enumerate(self._pending)
+        }
+        self._pending_arrays = None
+
+    def _use_arrays(self, arrays: Dict[str, np.ndarray]):
+        self._indptr = arrays["indptr"]
+        self._indices = arrays["indices"]
+        self._popularity = arrays["popularity"]
+        self._ids = arrays["ids"]
+        self._id_order = arrays["id_order"]
+        self._name_offsets = arrays["name_offsets"]
+        self._names = arrays["names"]
+
+    def _reload_if_changed(self):
+        if not self.enabled:
+            return
+        try:
+            mtime = os.stat(self._current_file()).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._current_mtime:
+            self._reload()
+
+    def _background_flush(self):
+        try:
+            self._flush()
+        except Exception as e:
+            print(f"Artist index flush failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._flushing = False
+
+    def _flush(self):
+        """
+        Merge pending artists into a new on-disk generation
+
+        Only the snapshot and the reload take `_lock`; searches keep
+        adding and scoring artists while the files are written.
+        """
+        if not self.enabled:
+            return
+
+        with self._flush_lock:
+            with self._lock:
+                pending = list(self._pending)
+            if not pending:
+                return
+
+            self._write_generation(pending)
+
+            with self._lock:
+                self._reload()
+
+    def _write_generation(self, pending: List[Dict]):
+        with self._file_lock(settings.ARTIST_INDEX_LOCK_TIMEOUT):
+            # Start from what's on disk now; another worker may have flushed.
+            # A generation we can't read raises, so it's never overwritten
+            loaded = self._read_generation()
+            if loaded is None:
+                genres, arrays = [], _empty_arrays()
+            else:
+                meta, arrays = loaded
+                genres = meta["genres"]
+
+            found = _find_rows(
+                arrays["ids"], arrays["id_order"], _encode_ids([a["id"] for a in pending])
+            )
+            new = [artist for artist, row in zip(pending, found) if row < 0]
+            if not new:
+                return
+
+            genre_ids = {genre: i for i, genre in enumerate(genres)}
+            new_indices = []
+            for artist in new:
+                for genre in artist["genres"]:
+                    if genre not in genre_ids:
+                        genre_ids[genre] = len(genres)
+                        genres.append(genre)
+                    new_indices.append(genre_ids[genre])
+
+            genre_lengths = [len(artist["genres"]) for artist in new]
+            names = [artist["name"].encode() for artist in new]
+            ids = np.concatenate((arrays["ids"], _encode_ids([a["id"] for a in new])))
+
+            name = f"gen-{uuid.uuid4().hex}"
+            generation = os.path.join(self.path, name)
+            os.makedirs(generation)
+            _save_array(generation, "indptr", np.concatenate((
+                arrays["indptr"],
+                arrays["indptr"][-1] + np.cumsum(genre_lengths, dtype=np.int64)
+            )))
+            _save_array(generation, "indices", np.concatenate((
+                arrays["indices"], np.array(new_indices, dtype=np.int32)
+            )))
+            _save_array(generation, "popularity", np.concatenate((
+                arrays["popularity"],
+                np.array([artist["popularity"] for artist in new], dtype=np.uint8)
+            )))
+            _save_array(generation, "ids", ids)
+            _save_array(generation, "id_order", np.argsort(ids, kind="stable").astype(np.int64))
+            _save_array(generation, "name_offsets", np.concatenate((
+                arrays["name_offsets"],
+                arrays["name_offsets"][-1] + np.cumsum([len(n) for n in names], dtype=np.int64)
+            )))
+            _save_array(generation, "names", np.concatenate((
+                arrays["names"], np.frombuffer(b"".join(names), dtype=np.uint8)
+            )))
+            with open(os.path.join(generation, "meta.json"), "w") as f:
+                json.dump({"genres": genres}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            _fsync_dir(generation)
+
+            # Only point CURRENT at the generation once it is fully on disk
+            tmp_current = f"{self._current_file()}.{name}"
+            with open(tmp_current, "w") as f:
+                f.write(name)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_current, self._current_file())
+            _fsync_dir(self.path)
+
+            # Old generations can go; open mappings keep working on POSIX
+            for entry in os.listdir(self.path):
+                if entry.startswith("gen-") and entry != name:
+                    shutil.rmtree(os.path.join(self.path, entry), ignore_errors=True)
+
+
+artist_index = ArtistIndex(settings.ARTIST_INDEX_DIR)
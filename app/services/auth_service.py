@@ -2,6 +2,7 @@ import secrets
 from typing import Dict, Optional
 import requests
 from urllib.parse import urlencode
+from app.core import upstream
 from app.core.config import settings
 
 class AuthService:
@@ -62,7 +63,9 @@ class AuthService:
         auth_bytes = auth_str.encode('utf-8')
         auth_b64 = base64.b64encode(auth_bytes).decode('utf-8')
         
-        response = requests.post(
+        response = upstream.request(
+            "token",
+            "POST",
             "https://accounts.spotify.com/api/token",
             headers={
                 "Authorization": f"Basic {auth_b64}",
@@ -93,7 +96,9 @@ class AuthService:
         auth_str = f"{settings.Spotify_CLIENT_ID}:{settings.SPOTIFY_CLIENT_SECRET}"
         auth_b64 = requests.utils.quote(auth_str, safe='')
         
-        response = requests.post(
+        response = upstream.request(
+            "token",
+            "POST",
             "https://accounts.spotify.com/api/token",
             headers={
                 "Authorization": f"Basic {auth_b64}",
@@ -119,7 +124,9 @@ class AuthService:
     def get_user_profile(access_token: str) -> Dict:
         """Get current user's profile from Spotify"""
         
-        response = requests.get(
+        response = upstream.request(
+            "me",
+            "GET",
             "https://api.spotify.com/v1/me",
             headers={"Authorization": f"Bearer {access_token}"}
         )
@@ -0,0 +1,199 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+import requests
+from urllib3.exceptions import NewConnectionError
+from app.core import upstream
+from app.core.config import settings
+
+
+class PlaylistWriteError(Exception):
+    """A chunk failed to write; `written` lists the chunk indices that landed"""
+
+    def __init__(self, message: str, written: List[int]):
+        super().__init__(message)
+        self.written = written
+
+
+class PlaylistService:
+    _CHUNK_SIZE = 100  # Spotify max URIs per add call
+    _API_URL = "https://api.spotify.com/v1"
+
+    @staticmethod
+    def create_playlist(
+        access_token: str,
+        user_id: str,
+        name: str,
+        description: str = "",
+        public: bool = False
+    ) -> Dict:
+        """Create an empty playlist for the user"""
+
+        response = upstream.request(
+            "playlists",
+            "POST",
+            f"{PlaylistService._API_URL}/users/{user_id}/playlists",
+            headers={"Authorization": f"Bearer {access_token}"},
+            json={
+                "name": name,
+                "description": description,
+                "public": public
+            }
+        )
+
+        if response.status_code not in (200, 201):
+            raise Exception(f"Failed to create playlist: {response.text}")
+
+        return response.json()
+
+    @staticmethod
+    def populate_playlist(
+        access_token: str,
+        playlist_id: str,
+        uris: List[str]
+    ) -> Iterator[Dict]:
+        """
+        Add URIs to a playlist in 100-item chunks, two writes at a time
+
+        Concurrent appends land in whatever order Spotify applies them, but
+        an insert at position 0 and an append give the same result in
+        either order. So the first half of the chunks is prepended last to
+        first while the second half is appended first to last, in parallel,
+        and the final order always matches `uris` without reading the
+        playlist back or reordering it.
+
+        Yields:
+            Progress events as each chunk lands
+
+        Raises:
+            PlaylistWriteError: a chunk failed; the playlist holds the chunks
+            listed in `written` and nothing else from `uris`
+        """
+        size = PlaylistService._CHUNK_SIZE
+        chunks = [uris[i:i + size] for i in range(0, len(uris), size)]
+        middle = len(chunks) // 2
+        events = queue.Queue()
+        stop = threading.Event()
+        written = []
+        failure = None
+
+        def write(indices: List[int], position: Optional[int]):
+            for index in indices:
+                if stop.is_set():
+                    return
+                attempts = PlaylistService._add_chunk(
+                    access_token, playlist_id, chunks[index], position
+                )
+                events.put((index, attempts))
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            streams = [
+                executor.submit(write, list(range(middle - 1, -1, -1)), 0),
+                executor.submit(write, list(range(middle, len(chunks))), None)
+            ]
+
+            added = 0
+            try:
+                for _ in range(len(chunks)):
+                    while True:
+                        try:
+                            index, attempts = events.get(timeout=0.1)
+                            break
+                        except queue.Empty:
+                            # Surface a failed stream instead of waiting forever
+                            for stream in streams:
+                                if stream.done() and stream.exception():
+                                    raise stream.exception()
+
+                    written.append(index)
+                    added += len(chunks[index])
+                    yield {
+                        "event": "chunk",
+                        "chunk": index,
+                        "attempts": attempts,
+                        "added": added,
+                        "total": len(uris)
+                    }
+            except Exception as e:
+                failure = e
+            finally:
+                # Don't start chunks we already know we can't finish
+                stop.set()
+
+        # The executor has waited for in-flight writes; count the ones that landed
+        if failure is not None:
+            while not events.empty():
+                written.append(events.get()[0])
+            raise PlaylistWriteError(str(failure), sorted(written)) from failure
+
+    @staticmethod
+    def _not_sent(error: requests.RequestException) -> bool:
+        """True if the request failed before it could reach Spotify"""
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        if not isinstance(error, requests.ConnectionError) or not error.args:
+            return False
+        reason = getattr(error.args[0], "reason", error.args[0])
+        return isinstance(reason, NewConnectionError)
+
+    @staticmethod
+    def _request(
+        method: str,
+        url: str,
+        access_token: str,
+        **kwargs
+    ) -> Tuple[requests.Response, int]:
+        """
+        Call Spotify with retries, returning the response and attempts made
+
+        Writes aren't idempotent (a lost response could mean the items were
+        added), so they only retry when Spotify certainly didn't apply them:
+        a 429 or a connection that was never made.
+        """
+        retries = settings.PLAYLIST_CHUNK_RETRIES
+        for attempt in range(retries + 1):
+            try:
+                response = upstream.request(
+                    "playlists",
+                    method,
+                    url,
+                    headers={"Authorization": f"Bearer {access_token}"},
+                    **kwargs
+                )
+            except requests.RequestException as e:
+                if attempt == retries or not PlaylistService._not_sent(e):
+                    raise
+                time.sleep(0.5 * 2 ** attempt)
+                continue
+
+            if response.status_code == 429 and attempt < retries:
+                time.sleep(int(response.headers.get("Retry-After", 1)))
+            else:
+                return response, attempt + 1
+
+    @staticmethod
+    def _add_chunk(
+        access_token: str,
+        playlist_id: str,
+        uris: List[str],
+        position: Optional[int] = None
+    ) -> int:
+        """Add one chunk (appended unless `position` is given), returning the attempts it took"""
+
+        body = {"uris": uris}
+        if position is not None:
+            body["position"] = position
+
+        response, attempts = PlaylistService._request(
+            "POST",
+            f"{PlaylistService._API_URL}/playlists/{playlist_id}/tracks",
+            access_token,
+            json=body
+        )
+
+        if response.status_code not in (200, 201):
+            raise Exception(f"Failed to add tracks: {response.text}")
+
+        return attempts
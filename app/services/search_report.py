@@ -0,0 +1,70 @@
+"""
+Replay a search query log and report how many upstream Spotify calls
+query normalization and page-aligned fetching save.
+
+Usage:
+    python -m app.services.search_report queries.jsonl
+
+Each log line is a JSON object with the /search parameters:
+    {"q": "Daft Punk", "type": "track", "limit": 10, "offset": 0, "market": "PT"}
+"""
+import json
+import sys
+from typing import Dict, Iterable
+
+from app.services.spotify_service import SpotifyService
+
+
+def upstream_call_report(entries: Iterable[Dict]) -> Dict:
+    """
+    Count upstream calls for a replayed log under each strategy
+
+    Assumes a cache that never expires, so the numbers are the best case
+    for each strategy within the replayed period.
+    """
+    page_size = SpotifyService._PAGE_SIZE
+    requests_seen = 0
+    exact_keys = set()
+    page_keys = set()
+
+    for entry in entries:
+        query = entry["q"]
+        search_type = entry.get("type", "track")
+        limit = min(int(entry.get("limit", 20)), page_size)
+        offset = int(entry.get("offset", 0))
+        market = entry.get("market")
+
+        requests_seen += 1
+        exact_keys.add((query, search_type, limit, offset, market))
+
+        normalized = SpotifyService.normalize_query(query)
+        first_page = offset - offset % page_size
+        for page_offset in range(first_page, offset + limit, page_size):
+            page_keys.add(SpotifyService.search_cache_key(
+                normalized, search_type, market, page_offset
+            ))
+
+    def reduction(calls: int) -> float:
+        if not requests_seen:
+            return 0.0
+        return round(100 * (1 - calls / requests_seen), 1)
+
+    return {
+        "requests": requests_seen,
+        "uncached_calls": requests_seen,
+        "exact_key_calls": len(exact_keys),
+        "exact_key_reduction_pct": reduction(len(exact_keys)),
+        "normalized_aligned_calls": len(page_keys),
+        "normalized_aligned_reduction_pct": reduction(len(page_keys))
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+
+    with open(sys.argv[1]) as log:
+        entries = [json.loads(line) for line in log if line.strip()]
+
+    print(json.dumps(upstream_call_report(entries), indent=2))
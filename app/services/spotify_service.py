@@ -1,25 +1,96 @@
-import requests
 import base64
+import threading
 import time
-from typing import Dict, List, Optional
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+from app.core import timing, upstream
 from app.core.config import settings
+from app.core.token_store import SharedTokenStore
+from app.services.artist_index import artist_index
 
 class SpotifyService:
     # Cache para o token
     _token_cache = None
     _token_expiry = 0
     _TOKEN_DURATION = 3500  # Segundos (1 hora menos margem)
+    _TOKEN_REFRESH_MARGIN = 300  # Renovar antes de expirar, sem bloquear
+    _token_store = SharedTokenStore(settings.SPOTIFY_TOKEN_FILE)
+
+    # Cache de pesquisa: (query, type, market, page_offset) -> (expiry, data)
+    _search_cache = OrderedDict()
+    _search_lock = threading.Lock()
+    _search_inflight: Dict[Tuple, Future] = {}  # Fetches in progress, by key
+    _PAGE_SIZE = 50  # Spotify max per request
+    _QUERY_OPERATORS = {"NOT", "OR"}  # Only work in uppercase
 
     @staticmethod
     def get_client_token():
-        """Get Spotify API access token with cache"""
+        """Get Spotify API access token with cache shared across workers"""
         
         # Check if we have a valid cached token
         current_time = time.time()
+        refresh_at = current_time + SpotifyService._TOKEN_REFRESH_MARGIN
         if (SpotifyService._token_cache and 
-            SpotifyService._token_expiry > current_time):
+            SpotifyService._token_expiry > refresh_at):
             return SpotifyService._token_cache
         
+        # Another worker may already have refreshed it
+        store = SpotifyService._token_store
+        shared = SpotifyService._read_shared_token()
+        if shared and shared["expires_at"] > refresh_at:
+            return SpotifyService._use_token(shared)
+        
+        # Only wait for the refresh lock if there's no usable token at all
+        still_valid = bool(shared and shared["expires_at"] > current_time)
+        lock_timeout = 0 if still_valid else settings.SPOTIFY_TOKEN_LOCK_TIMEOUT
+        with store.refresh_lock(timeout=lock_timeout) as acquired:
+            if not acquired and still_valid:
+                return SpotifyService._use_token(shared)
+            
+            if not acquired:
+                # The lock holder is stuck; get a token for this process only
+                return SpotifyService._use_token({
+                    "access_token": SpotifyService._request_client_token(),
+                    "expires_at": time.time() + SpotifyService._TOKEN_DURATION
+                })
+            
+            # Re-check now that we hold the lock
+            shared = SpotifyService._read_shared_token()
+            if shared and shared["expires_at"] > refresh_at:
+                return SpotifyService._use_token(shared)
+            
+            shared = {
+                "client_id": settings.SPOTIFY_CLIENT_ID,
+                "access_token": SpotifyService._request_client_token(),
+                "expires_at": time.time() + SpotifyService._TOKEN_DURATION
+            }
+            store.write(shared)
+        
+        return SpotifyService._use_token(shared)
+    
+    @staticmethod
+    def _read_shared_token() -> Optional[Dict]:
+        """Read the shared token if it belongs to the configured client"""
+        shared = SpotifyService._token_store.read()
+        if (not shared or
+                shared.get("client_id") != settings.SPOTIFY_CLIENT_ID or
+                not shared.get("access_token")):
+            return None
+        return shared
+    
+    @staticmethod
+    def _use_token(shared: Dict) -> str:
+        """Cache a shared token in this process and return it"""
+        SpotifyService._token_cache = shared["access_token"]
+        SpotifyService._token_expiry = shared["expires_at"]
+        return SpotifyService._token_cache
+    
+    @staticmethod
+    def _request_client_token() -> str:
+        """Request a new client credentials token from Spotify"""
+        
         # Validate credentials
         if not settings.SPOTIFY_CLIENT_ID or not settings.SPOTIFY_CLIENT_SECRET:
             raise ValueError("Spotify credentials not configured")
@@ -29,13 +100,16 @@ class SpotifyService:
         auth_b64 = base64.b64encode(auth_str.encode()).decode()
         
         # Request token from Spotify
-        response = requests.post(
+        response = upstream.request(
+            "token",
+            "POST",
             "https://accounts.spotify.com/api/token",
             headers={
                 "Authorization": f"Basic {auth_b64}",
                 "Content-Type": "application/x-www-form-urlencoded"
             },
-            data={"grant_type": "client_credentials"}
+            data={"grant_type": "client_credentials"},
+            timeout=settings.SPOTIFY_TOKEN_TIMEOUT
         )
         
         # Check for errors
@@ -55,10 +129,6 @@ class SpotifyService:
         if not token:
             raise Exception("No access token in response")
         
-        # Cache the token
-        SpotifyService._token_cache = token
-        SpotifyService._token_expiry = current_time + SpotifyService._TOKEN_DURATION
-        
         return token
     
     @staticmethod
@@ -82,21 +152,126 @@ class SpotifyService:
         Returns:
             Dictionary with search results
         """
-        token = SpotifyService.get_client_token()
+        query = SpotifyService.normalize_query(query)
+        limit = min(limit, SpotifyService._PAGE_SIZE)
+        
+        # Fetch the aligned upstream pages covering [offset, offset + limit)
+        first_page = offset - offset % SpotifyService._PAGE_SIZE
+        last_page = (offset + limit - 1) // SpotifyService._PAGE_SIZE * SpotifyService._PAGE_SIZE
+        
+        pages = []
+        for page_offset in range(first_page, last_page + 1, SpotifyService._PAGE_SIZE):
+            page = SpotifyService._fetch_search_page(
+                query, search_type, market, page_offset
+            )
+            pages.append(page)
+            
+            # Don't ask for pages past the end of the results
+            totals = [v.get("total", 0) for v in page.values() if isinstance(v, dict)]
+            if page_offset + SpotifyService._PAGE_SIZE >= max(totals, default=0):
+                break
+        
+        return SpotifyService._slice_pages(pages, first_page, limit, offset)
+    
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """
+        Canonicalize a search query (Unicode NFKC, case, whitespace)
+        
+        Terms are lowercased since Spotify matches them case-insensitively,
+        but the uppercase NOT/OR operators are kept so the search means the
+        same thing.
+        """
+        query = unicodedata.normalize("NFKC", query)
+        return " ".join(
+            token if token in SpotifyService._QUERY_OPERATORS else token.lower()
+            for token in query.split()
+        )
+    
+    @staticmethod
+    def search_cache_key(
+        query: str,
+        search_type: str,
+        market: Optional[str],
+        page_offset: int
+    ) -> Tuple:
+        """Cache key for one aligned upstream search page"""
+        types = ",".join(sorted(t.strip().lower() for t in search_type.split(",")))
+        return (query, types, (market or "").upper(), page_offset)
+    
+    @staticmethod
+    def _fetch_search_page(
+        query: str,
+        search_type: str,
+        market: Optional[str],
+        page_offset: int
+    ) -> Dict:
+        """
+        Get one aligned 50-item search page, from cache when possible
+
+        Concurrent misses for the same page share a single upstream call.
+        """
+        
+        key = SpotifyService.search_cache_key(query, search_type, market, page_offset)
+        cache = SpotifyService._search_cache
+        
+        with SpotifyService._search_lock:
+            cached = cache.get(key)
+            if cached and cached[0] > time.time():
+                cache.move_to_end(key)
+                return cached[1]
+            
+            pending = SpotifyService._search_inflight.get(key)
+            leader = pending is None
+            if leader:
+                pending = SpotifyService._search_inflight[key] = Future()
+        
+        if not leader:
+            with timing.phase("upstream"):
+                return pending.result()
+        
+        try:
+            data = SpotifyService._request_search_page(key, page_offset)
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with SpotifyService._search_lock:
+                del SpotifyService._search_inflight[key]
+        
+        # Cache the page, dropping the least recently used ones
+        with SpotifyService._search_lock:
+            cache[key] = (time.time() + settings.SEARCH_CACHE_TTL, data)
+            cache.move_to_end(key)
+            while len(cache) > settings.SEARCH_CACHE_SIZE:
+                cache.popitem(last=False)
+        
+        pending.set_result(data)
+        return data
+    
+    @staticmethod
+    def _request_search_page(key: Tuple, page_offset: int) -> Dict:
+        """Fetch one search page from Spotify"""
+        query, search_type, market, _ = key
+        
+        with timing.phase("token"):
+            token = SpotifyService.get_client_token()
         
         # Prepare parameters
         params = {
             "q": query,
             "type": search_type,
-            "limit": min(limit, 50),  # Spotify max is 50
-            "offset": offset
+            "limit": SpotifyService._PAGE_SIZE,
+            "offset": page_offset
         }
         
         if market:
             params["market"] = market
         
         # Make request to Spotify API
-        response = requests.get(
+        response = upstream.request(
+            "search",
+            "GET",
             "https://api.spotify.com/v1/search",
             headers={"Authorization": f"Bearer {token}"},
             params=params
@@ -112,7 +287,38 @@ class SpotifyService:
                 pass
             raise Exception(error_msg)
         
-        return response.json()
+        with timing.phase("parse"):
+            return response.json()
+    
+    @staticmethod
+    def _slice_pages(
+        pages: List[Dict],
+        first_page: int,
+        limit: int,
+        offset: int
+    ) -> Dict:
+        """Cut the requested window out of consecutive aligned pages"""
+        start = offset - first_page
+        results = {}
+        
+        for result_key, first in pages[0].items():
+            if not isinstance(first, dict):
+                results[result_key] = first
+                continue
+            
+            items = []
+            for page in pages:
+                items.extend(page.get(result_key, {}).get("items", []))
+            
+            # href/next/previous point at the aligned page, not this window
+            results[result_key] = {
+                "items": items[start:start + limit],
+                "limit": limit,
+                "offset": offset,
+                "total": first.get("total", 0)
+            }
+        
+        return results
     
     @staticmethod
     def search_tracks(
@@ -134,36 +340,37 @@ class SpotifyService:
         )
         
         tracks = results.get("tracks", {}).get("items", [])
-        formatted_tracks = []
-        
-        for track in tracks:
-            # Get artists names
-            artists = [artist["name"] for artist in track.get("artists", [])]
-            
-            # Get album image (try different sizes)
-            album_images = track.get("album", {}).get("images", [])
-            image_url = album_images[0]["url"] if album_images else None
+        with timing.phase("format"):
+            formatted_tracks = []
             
-            # Get preview URL (30 second preview)
-            preview_url = track.get("preview_url")
+            for track in tracks:
+                # Get artists names
+                artists = [artist["name"] for artist in track.get("artists", [])]
+                
+                # Get album image (try different sizes)
+                album_images = track.get("album", {}).get("images", [])
+                image_url = album_images[0]["url"] if album_images else None
+                
+                # Get preview URL (30 second preview)
+                preview_url = track.get("preview_url")
+                
+                formatted_track = {
+                    "id": track.get("id"),
+                    "name": track.get("name"),
+                    "artists": artists,
+                    "artist_names": ", ".join(artists),
+                    "album": track.get("album", {}).get("name"),
+                    "album_id": track.get("album", {}).get("id"),
+                    "duration_ms": track.get("duration_ms"),
+                    "popularity": track.get("popularity"),
+                    "track_number": track.get("track_number"),
+                    "image_url": image_url,
+                    "preview_url": preview_url,
+                    "external_url": track.get("external_urls", {}).get("spotify"),
+                    "uri": track.get("uri")
+                }
+                formatted_tracks.append(formatted_track)
             
-            formatted_track = {
-                "id": track.get("id"),
-                "name": track.get("name"),
-                "artists": artists,
-                "artist_names": ", ".join(artists),
-                "album": track.get("album", {}).get("name"),
-                "album_id": track.get("album", {}).get("id"),
-                "duration_ms": track.get("duration_ms"),
-                "popularity": track.get("popularity"),
-                "track_number": track.get("track_number"),
-                "image_url": image_url,
-                "preview_url": preview_url,
-                "external_url": track.get("external_urls", {}).get("spotify"),
-                "uri": track.get("uri")
-            }
-            formatted_tracks.append(formatted_track)
-        
         return formatted_tracks
     
     @staticmethod
@@ -171,6 +378,13 @@ class SpotifyService:
         """Clear cached token (for testing or credential changes)"""
         SpotifyService._token_cache = None
         SpotifyService._token_expiry = 0
+        SpotifyService._token_store.clear()
+    
+    @staticmethod
+    def clear_search_cache():
+        """Clear cached search pages"""
+        with SpotifyService._search_lock:
+            SpotifyService._search_cache.clear()
 
 
     @staticmethod
@@ -193,23 +407,27 @@ class SpotifyService:
         )
         
         artists = results.get("artists", {}).get("items", [])
-        formatted_artists = []
-        
-        for artist in artists:
-            # Get artist images
-            images = artist.get("images", [])
-            image_url = images[0]["url"] if images else None
+        with timing.phase("format"):
+            formatted_artists = []
             
-            formatted_artist = {
-                "id": artist.get("id"),
-                "name": artist.get("name"),
-                "genres": artist.get("genres", []),
-                "popularity": artist.get("popularity"),
-                "followers": artist.get("followers", {}).get("total", 0),
-                "image_url": image_url,
-                "external_url": artist.get("external_urls", {}).get("spotify"),
-                "uri": artist.get("uri")
-            }
-            formatted_artists.append(formatted_artist)
+            for artist in artists:
+                # Get artist images
+                images = artist.get("images", [])
+                image_url = images[0]["url"] if images else None
+                
+                formatted_artist = {
+                    "id": artist.get("id"),
+                    "name": artist.get("name"),
+                    "genres": artist.get("genres", []),
+                    "popularity": artist.get("popularity"),
+                    "followers": artist.get("followers", {}).get("total", 0),
+                    "image_url": image_url,
+                    "external_url": artist.get("external_urls", {}).get("spotify"),
+                    "uri": artist.get("uri")
+                }
+                formatted_artists.append(formatted_artist)
+        
+        # Keep the artists for local similarity queries
+        artist_index.add_artists(formatted_artists)
         
         return formatted_artists
\ No newline at end of file
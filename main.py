@@ -1,20 +1,44 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import spotify
+from app.core import upstream
 from app.core.config import settings
+from app.core.rate_limit import RateLimitMiddleware
+from app.core.timing import ServerTimingMiddleware, TimedJSONResponse
 from app.api import auth
+from app.api import playlists
+from app.services.artist_index import artist_index
 from app.api.auth import router as auth_router
 
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Save artists seen since the last flush
+    try:
+        artist_index.flush()
+    except Exception as e:
+        print(f"Artist index flush failed: {str(e)}")
+
+
 # Create FastAPI application
 app = FastAPI(
     title="RDS Spotify Backend",
     description="API for Spotify statistics and smart playlists",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=TimedJSONResponse,
+    lifespan=lifespan
 )
 
-# Configure CORS (for frontend access)
+# Per-user / per-IP quotas (closest to the routes)
+app.add_middleware(RateLimitMiddleware)
+
+# Server-Timing breakdown and opt-in profiling (wraps the limiter so 429s get it too)
+app.add_middleware(ServerTimingMiddleware)
+
+# Configure CORS (for frontend access; outermost so 429s reach the frontend too)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],  #  Next.js frontend
@@ -36,6 +60,12 @@ app.include_router(
     tags=["auth"]
 )
 
+app.include_router(
+    playlists.router,
+    prefix="/api/playlists",
+    tags=["playlists"]
+)
+
 
 # Include callback redirect route
 from app.api import callback
@@ -77,4 +107,8 @@ async def auth_callback_redirect():
 # Health check endpoint
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "spotify-api"}
\ No newline at end of file
+    return {
+        "status": "healthy",
+        "service": "spotify-api",
+        "upstream": upstream.metrics()
+    }
\ No newline at end of file